@@ -68,12 +68,11 @@ def lookup_in_cache(
     """
     lock = get_cache_lock(repo_slug, cache_directory)
     lock.acquire()
-    cache_entry = get_cache_path(repo_slug, cache_directory)
-    cache_entry.parent.mkdir(parents=True, exist_ok=True)
-    if is_in_cache(cache_key, repo_slug, cache_directory):
+    # The cache file is parsed once for both the lookup and the placeholder write.
+    cache = load_cache(repo_slug, cache_directory)
+    if cache_key in cache:
         total_time = 0
         while True:
-            cache = load_cache(repo_slug, cache_directory)
             cache_data = cache[cache_key]
             if cache_data is not None:
                 break
@@ -83,11 +82,13 @@ def lookup_in_cache(
             if total_time > TIMEOUT:
                 return None
             lock.acquire()
+            cache = load_cache(repo_slug, cache_directory)
         lock.release()
         return cache_data
     if set_run:
         logger.debug(f"lookup_in_cache: Setting {cache_key} to None for {repo_slug}")
-        set_in_cache(cache_key, None, repo_slug, cache_directory, acquire_lock=False)
+        cache[cache_key] = None
+        write_cache(cache, repo_slug, cache_directory)
     lock.release()
     return None
 
@@ -121,25 +122,9 @@ def get_cache_path(repo_slug: str, cache_directory: Path) -> Path:
     """
     cache_file_name = repo_slug + ".json"
     cache_path = cache_directory / cache_file_name
-    cache_path.parent.mkdir(parents=True, exist_ok=True)
     return cache_path
 
 
-def is_in_cache(
-    cache_key: Union[Tuple, str], repo_slug: str, cache_directory: Path
-) -> bool:
-    """Checks if the key is in the cache.
-    Args:
-        cache_key (Union[Tuple,str]): The key to check.
-        repo_slug (str): The slug of the repository, which is "owner/reponame".
-        cache_directory (Path): The path prefix to the cache directory.
-    Returns:
-        bool: True if the repository is in the cache, False otherwise.
-    """
-    cache = load_cache(repo_slug, cache_directory)
-    return cache_key in cache
-
-
 def load_cache(repo_slug: str, cache_directory: Path) -> dict:
     """Loads the cache associated to the repo_slug found in the cache directory.
     Args:
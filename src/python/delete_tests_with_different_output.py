@@ -20,22 +20,29 @@ def main():
     rows_affected = 0
     entries_deleted = 0
     args = parser.parse_args()
-    df = pd.read_csv(Path(args.result))
+    # intellimerge is not compared, and its columns may be absent.
+    merge_tools = [
+        merge_tool for merge_tool in MERGE_TOOL if merge_tool != MERGE_TOOL.intellimerge
+    ]
+    df = pd.read_csv(
+        Path(args.result),
+        usecols=["repository", "left", "right"]
+        + [merge_tool.name for merge_tool in merge_tools]
+        + [merge_tool.name + "_merge_fingerprint" for merge_tool in merge_tools],
+    )
     for _, row in df.iterrows():
         failed_tests_count = len(
             [
                 row[merge_tool.name]
-                for merge_tool in MERGE_TOOL
-                if merge_tool != MERGE_TOOL.intellimerge
-                and row[merge_tool.name] == TEST_STATE.Tests_failed.name
+                for merge_tool in merge_tools
+                if row[merge_tool.name] == TEST_STATE.Tests_failed.name
             ]
         )
         successful_tests_count = len(
             [
                 row[merge_tool.name]
-                for merge_tool in MERGE_TOOL
-                if merge_tool != MERGE_TOOL.intellimerge
-                and row[merge_tool.name] == TEST_STATE.Tests_passed.name
+                for merge_tool in merge_tools
+                if row[merge_tool.name] == TEST_STATE.Tests_passed.name
             ]
         )
         if failed_tests_count > 0 and successful_tests_count > 0:
@@ -45,9 +52,7 @@ def main():
             with open(sha_cache, "r", encoding="utf-8") as file:
                 data = json.load(file)
             sha_to_del = set()
-            for merge_tool in MERGE_TOOL:
-                if merge_tool == MERGE_TOOL.intellimerge:
-                    continue
+            for merge_tool in merge_tools:
                 if (
                     row[merge_tool.name] == TEST_STATE.Tests_failed.name
                     or row[merge_tool.name] == TEST_STATE.Tests_passed.name
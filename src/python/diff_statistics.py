@@ -1,30 +1,59 @@
 # -*- coding: utf-8 -*-
-from pathlib import Path
-from typing import Union, Set
+from collections import OrderedDict
+import functools
+from typing import FrozenSet, Iterator, Union, Tuple
 
 from loguru import logger
 
 from repo import Repository
 
+MEMOIZED_DIFFS_MAX_SIZE = 1024
 
-def get_diff(
-    repo: Repository, left_sha: str, right_sha: str, diff_log_file: Union[None, Path]
-) -> str:
+
+def memoize_diff(func=None, *, symmetric: bool = False):
+    """A decorator that memoizes a function of a repository and commit hashes.
+    The diff between two commits never changes, so the result is keyed by the
+    repository slug and the hashes. Only the most recent results are kept.
+    Exceptions are not memoized. Every caller shares the memoized result, so the
+    function must return an immutable value.
+    Args:
+        symmetric (bool, optional) = False: Whether the result does not depend on
+            the order of the hashes, so that swapped hashes share one entry.
+    """
+    if func is None:
+        return functools.partial(memoize_diff, symmetric=symmetric)
+    results: OrderedDict = OrderedDict()
+
+    @functools.wraps(func)
+    def wrapper(repo: Repository, *shas: str):
+        key = (repo.repo_slug, *(sorted(shas) if symmetric else shas))
+        if key in results:
+            results.move_to_end(key)
+            return results[key]
+        result = func(repo, *shas)
+        results[key] = result
+        if len(results) > MEMOIZED_DIFFS_MAX_SIZE:
+            results.popitem(last=False)
+        return result
+
+    return wrapper
+
+
+def iter_diff_lines(repo: Repository, left_sha: str, right_sha: str) -> Iterator[str]:
     """
-    Computes the git diff between two commits.
+    Streams the git diff between two commits, without holding it in memory.
     Args:
         repo (Repository): The repository object.
         left_sha (str): The left sha.
         right_sha (str): The right sha.
     Returns:
-        str: A string containing the diff result.
+        Iterator[str]: The lines of the diff.
     """
-    command = f"git diff {left_sha} {right_sha}"
-    stdout, _ = repo.run_command(command)
-    return stdout
+    return repo.run_command_iter(f"git diff {left_sha} {right_sha}")
 
 
-def get_diff_files(repo: Repository, left_sha: str, right_sha: str) -> set:
+@memoize_diff
+def get_diff_files(repo: Repository, left_sha: str, right_sha: str) -> FrozenSet[str]:
     """
     Computes the set of files that are different between two commits using git diff.
     Args:
@@ -32,12 +61,41 @@ def get_diff_files(repo: Repository, left_sha: str, right_sha: str) -> set:
         left_sha (str): The left sha.
         right_sha (str): The right sha.
     Returns:
-        set: A set containing the files that differ.
+        FrozenSet[str]: A set containing the files that differ.
     """
-    # Using git diff to compare the two SHAs
-    command = f"git diff --name-only {left_sha} {right_sha}"
+    # Using git diff to compare the two SHAs. With -z, file names are output
+    # verbatim (not quoted) and terminated by NUL, so names may contain newlines.
+    command = f"git diff --name-only -z {left_sha} {right_sha}"
     stdout, _ = repo.run_command(command)
-    return set(stdout.split("\n")) if stdout else set()
+    # Every name is terminated by NUL, so the split ends with an empty string.
+    return frozenset(filter(None, stdout.split("\0")))
+
+
+@memoize_diff
+def get_diff_line_statistics(
+    repo: Repository, left_sha: str, right_sha: str
+) -> Tuple[int, bool]:
+    """
+    Computes the line statistics of the diff between two commits with a single git diff.
+    Args:
+        repo (Repository): The repository object.
+        left_sha (str): The left sha.
+        right_sha (str): The right sha.
+    Returns:
+        int: The number of lines that are different between the two commits.
+        bool: True if the diff contains an import statement, False otherwise.
+    """
+    num_diff_lines = 0
+    imports_involved = False
+    for output_line in iter_diff_lines(repo, left_sha, right_sha):
+        # splitlines() also breaks at separators such as form feeds, as the
+        # statistics have always been computed.
+        for line in output_line.splitlines():
+            if line.startswith(("+", "-")) and not line.startswith(("+++ ", "--- ")):
+                num_diff_lines += 1
+        if not imports_involved and "import " in output_line:
+            imports_involved = True
+    return num_diff_lines, imports_involved
 
 
 def compute_num_diff_hunks(repo: Repository, left_sha: str, right_sha: str) -> int:
@@ -51,22 +109,35 @@ def compute_num_diff_hunks(repo: Repository, left_sha: str, right_sha: str) -> i
         int: The number of hunks that are different between the two commits.
     """
     try:
-        diff, _ = repo.run_command(
-            f"git diff --unified=0 {left_sha} {right_sha} | grep -c '^@@'"
-        )
+        diff, _ = repo.run_command(f"git diff --unified=0 {left_sha} {right_sha}")
     except Exception as e:
         logger.error(
             f"compute_num_diff_hunks: {left_sha} {right_sha} {repo.repo_slug} {e}"
         )
         return "Error"
-    return int(diff)
+    return sum(1 for line in diff.splitlines() if line.startswith("@@"))
+
+
+@memoize_diff(symmetric=True)
+def get_merge_base(repo: Repository, left_sha: str, right_sha: str) -> str:
+    """
+    Computes the merge base of two commits using git merge-base.
+    Args:
+        repo (Repository): The repository object.
+        left_sha (str): The left sha.
+        right_sha (str): The right sha.
+    Returns:
+        str: The sha of the merge base.
+    """
+    command = f"git merge-base {left_sha} {right_sha}"
+    return repo.run_command(command)[0].strip()
 
 
 def get_diff_files_merge(
     repo: Repository,
     left_sha: str,
     right_sha: str,
-) -> Set[str]:
+) -> FrozenSet[str]:
     """
     Computes the intersection of files that are different between a three-way merge using git diff.
     Args:
@@ -77,10 +148,9 @@ def get_diff_files_merge(
         right_sha (str): The right sha.
         cache_dir (Path): The path to the cache directory.
     Returns:
-        Set[str]: A set containing the files that differ.
+        FrozenSet[str]: A set containing the files that differ.
     """
-    command = f"git merge-base {left_sha} {right_sha}"
-    base_sha = repo.run_command(command)[0].strip()
+    base_sha = get_merge_base(repo, left_sha, right_sha)
     left_right_files = get_diff_files(repo, left_sha, right_sha)
     base_right_files = get_diff_files(repo, base_sha, right_sha)
     base_left_files = get_diff_files(repo, base_sha, left_sha)
@@ -208,17 +278,13 @@ def compute_num_different_lines(
         int: The number of lines that are different between the two commits.
     """
     try:
-        diff = get_diff(repo, left_sha, right_sha, None)
+        num_diff_lines, _ = get_diff_line_statistics(repo, left_sha, right_sha)
     except Exception as e:
         logger.error(
             f"compute_num_different_lines: {left_sha} {right_sha} {repo.repo_slug} {e}"
         )
         return None
-    return sum(
-        1
-        for line in diff.splitlines()
-        if line.startswith(("+", "-")) and not line.startswith(("+++ ", "--- "))
-    )
+    return num_diff_lines
 
 
 def compute_are_imports_involved(
@@ -234,10 +300,10 @@ def compute_are_imports_involved(
         bool: True if the diff contains an import statement, False otherwise.
     """
     try:
-        diff = get_diff(repo, left_sha, right_sha, None)
+        _, imports_involved = get_diff_line_statistics(repo, left_sha, right_sha)
     except Exception as e:
         logger.error(
             f"compute_imports_involved: {left_sha} {right_sha} {repo.repo_slug} {e}"
         )
         return None
-    return "import " in diff
+    return imports_involved
@@ -377,7 +377,9 @@ def main():
 
     # Combine results file
     result_df_list = []
-    repos = pd.read_csv(args.repos_head_passes_csv, index_col="idx")
+    repos = pd.read_csv(
+        args.repos_head_passes_csv, index_col="idx", usecols=["idx", "repository"]
+    )
     with Progress(
         SpinnerColumn(),
         TextColumn("[progress.description]{task.description}"),
@@ -793,8 +795,10 @@ def main():
                 file.write(table3)
 
     # Create defs.tex
-    full_repos_df = pd.read_csv(args.full_repos_csv)
-    repos_head_passes_df = pd.read_csv(args.repos_head_passes_csv)
+    full_repos_df = pd.read_csv(args.full_repos_csv, usecols=["repository"])
+    repos_head_passes_df = pd.read_csv(
+        args.repos_head_passes_csv, usecols=["repository"]
+    )
 
     # Change from _a to A capitalizaion
     run_name_camel_case = args.run_name.split("_")[0] + "".join(
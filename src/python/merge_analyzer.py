@@ -41,6 +41,7 @@ from diff_statistics import (
     compute_num_diff_hunks,
     compute_union_of_different_files_three_way,
     compute_intersection_of_diff,
+    get_merge_base,
 )
 
 
@@ -102,17 +103,14 @@ def merge_analyzer(
                 )
             # Pass in base sha for union and intersection stats.
             if name == "union_diff_files" or name == "num_intersecting_files":
-                command = (
-                    "git merge-base "
-                    + str(merge_data["left"])
-                    + " "
-                    + str(merge_data["right"])
-                )
                 try:
-                    base_sha = repo.run_command(command)[0].strip()
+                    base_sha = get_merge_base(
+                        repo, str(merge_data["left"]), str(merge_data["right"])
+                    )
                 except Exception as e:
                     logger.error(
-                        f"merge_analyzer: Error while running command: {command}"
+                        "merge_analyzer: Error while computing the merge base of "
+                        f"{merge_data['left']} {merge_data['right']}"
                     )
                     logger.error(f"merge_analyzer: Error: {e}")
                     cache_data[name] = "Error while retrieving base sha"
@@ -188,7 +186,7 @@ def merge_analyzer(
         cache_data["right parent test result"] = result.name
 
         # Produce the final result
-        print(
+        logger.info(
             f"merge_analyzer: {merge_idx} {repo_slug} {left_sha} {right_sha} {cache_data['left parent test result']} {cache_data['right parent test result']}"
         )
         cache_data["parents pass"] = is_test_passed(
@@ -284,7 +282,9 @@ if __name__ == "__main__":
     (Path(args.cache_dir) / "merge_analysis").mkdir(parents=True, exist_ok=True)
     Path(args.output_dir).mkdir(parents=True, exist_ok=True)
 
-    repos = pd.read_csv(args.repos_head_passes_csv, index_col="idx")
+    repos = pd.read_csv(
+        args.repos_head_passes_csv, index_col="idx", usecols=["idx", "repository"]
+    )
 
     logger.info("merge_analyzer: Constructing Inputs")
     merger_arguments = []
@@ -44,7 +44,9 @@ def main():
     Path(args.output_dir).mkdir(parents=True, exist_ok=True)
     Path(cache_dir).mkdir(parents=True, exist_ok=True)
 
-    repos = pd.read_csv(args.repos_head_passes_csv, index_col="idx")
+    repos = pd.read_csv(
+        args.repos_head_passes_csv, index_col="idx", usecols=["idx", "repository"]
+    )
 
     logger.info("merge_timer: Started collecting merges to test")
 
@@ -22,7 +22,7 @@ import psutil
 import pandas as pd
 from repo import Repository, MERGE_TOOL, TEST_STATE, MERGE_STATE
 from test_repo_heads import num_processes
-from variables import TIMEOUT_TESTING_MERGE, TIMEOUT_MERGING, N_TESTS
+from variables import TIMEOUT_TESTING_MERGE, TIMEOUT_MERGING, N_TESTS, TASK_MEMORY
 from loguru import logger
 from rich.progress import (
     Progress,
@@ -43,9 +43,6 @@ def merge_tester(args: Tuple[str, str, pd.Series, Path]) -> pd.Series:
         pd.Series: The result of the test.
     """
     merge_idx, repo_slug, merge_data, cache_directory = args
-    print(
-        f"merge_tester: Started {merge_idx} {repo_slug} {merge_data['left']} {merge_data['right']}"
-    )
     logger.info(
         f"merge_tester: Started {merge_idx} {repo_slug} {merge_data['left']} {merge_data['right']}"
     )
@@ -160,7 +157,9 @@ def main():
     Path(args.cache_dir).mkdir(parents=True, exist_ok=True)
     Path(args.output_dir).mkdir(parents=True, exist_ok=True)
 
-    repos = pd.read_csv(args.repos_head_passes_csv, index_col="idx")
+    repos = pd.read_csv(
+        args.repos_head_passes_csv, index_col="idx", usecols=["idx", "repository"]
+    )
 
     logger.info("merge_tester: Started collecting merges to test")
     merge_tester_arguments = []
@@ -187,7 +186,9 @@ def main():
     )
 
     logger.info("merge_tester: Started Testing")
-    with multiprocessing.Pool(processes=num_processes()) as pool:
+    with multiprocessing.Pool(
+        processes=num_processes(memory_per_task=TASK_MEMORY)
+    ) as pool:
         with Progress(
             SpinnerColumn(),
             TextColumn("[progress.description]{task.description}"),
@@ -37,7 +37,9 @@ if __name__ == "__main__":
     parser.add_argument("--only_trivial_merges", action="store_true")
     args = parser.parse_args()
 
-    repos = pd.read_csv(args.repos_head_passes_csv, index_col="idx")
+    repos = pd.read_csv(
+        args.repos_head_passes_csv, index_col="idx", usecols=["idx", "repository"]
+    )
     Path(args.output_dir).mkdir(parents=True, exist_ok=True)
     missing_merges_repos = 0
     total_valid_repos = 0
@@ -21,7 +21,7 @@ from pathlib import Path
 import shutil
 import subprocess
 import pandas as pd
-from repo import Repository, MERGE_TOOL, TEST_STATE, MERGE_STATE
+from repo import Repository, MERGE_TOOL, TEST_STATE, MERGE_STATE, dissociate_clone
 from variables import TIMEOUT_TESTING_MERGE, N_TESTS, WORKDIR_DIRECTORY, TIMEOUT_MERGING
 from rich.progress import (
     Progress,
@@ -46,6 +46,10 @@ def store_artifacts(result_df: pd.DataFrame) -> None:
             repo_path = result_df.loc[idx, "repo path"]
             log_path = result_df.loc[idx, "merge log path"]
 
+            # A workdir that is deleted after use still borrows objects from the
+            # local clone, which is not archived.
+            dissociate_clone(Path(repo_path))  # type: ignore
+
             # Add repository directories or files to the tarball with absolute paths
             tar.add(repo_path, arcname=repo_path)  # type: ignore
 
@@ -6,18 +6,24 @@ It also contains the functions that are used to test the repository.
 """
 
 from pathlib import Path
-from typing import Union, Tuple, List, Dict
+from typing import Union, Tuple, List, Dict, Iterator
 import errno
 import signal
 import functools
+import codecs
 from enum import Enum
 import uuid
 import subprocess
+import tempfile
 import os
 import json
 import xml.etree.ElementTree as ET
 import shutil
 import time
+import atexit
+import multiprocessing.util
+import queue
+import threading
 from git.repo import Repo
 from git import GitCommandError
 from cache_utils import (
@@ -29,6 +35,7 @@ import git.repo
 from variables import (
     REPOS_PATH,
     WORKDIR_DIRECTORY,
+    RAMDISK_DIRECTORY,
     LEFT_BRANCH_NAME,
     RIGHT_BRANCH_NAME,
     DELETE_WORKDIRS,
@@ -37,6 +44,8 @@ from variables import (
 )
 from loguru import logger
 
+WORKDIR_DELETION_BACKLOG = 2  # Workdirs per process that may wait for deletion
+
 
 def timeout(seconds=10, error_message=os.strerror(errno.ETIME)):
     """A decorator that raises a TimeoutError if a function takes too long to run."""
@@ -60,9 +69,159 @@ def timeout(seconds=10, error_message=os.strerror(errno.ETIME)):
     return decorator
 
 
+def get_github_url(repo_slug: str) -> str:
+    """Returns the URL from which a repository is cloned.
+    Args:
+        repo_slug (str): The slug of the repository, which is "owner/reponame".
+    Returns:
+        str: The URL of the repository on GitHub.
+    """
+    # ":@" in URL ensures that we are not prompted for login details
+    # for the repos that are now private.
+    return "https://:@github.com/" + repo_slug + ".git"
+
+
+def dissociate_clone(repo_dir: Path) -> None:
+    """Makes a copy made by `Repository.copy_repo` self-contained, by copying the
+    objects that it and its submodule repositories borrow from the local clone
+    into them.  This is needed before the copy is archived, or if it is kept
+    after the local clone may be deleted.
+    Args:
+        repo_dir (Path): The directory of the copy.
+    """
+    for alternates in (repo_dir / ".git").glob("**/objects/info/alternates"):
+        git_dir = alternates.parents[2]
+        subprocess.run(
+            ["git", "--git-dir", str(git_dir), "repack", "-a", "-d", "-q"],
+            check=True,
+        )
+        alternates.unlink()
+
+
+def copy_remote_refs(git_dir: Path, source_git_dir: Path) -> None:
+    """Copies the remote-tracking refs of a repository into a clone of it.  A
+    clone only gets the branches of its source, but the local clone also has
+    the other branches and the pull request heads fetched from GitHub.
+    Args:
+        git_dir (Path): The git directory of the clone.
+        source_git_dir (Path): The git directory of the repository it was cloned
+            from.
+    """
+    subprocess.run(
+        ["git", "--git-dir", str(git_dir), "fetch", "-q", str(source_git_dir)]
+        + ["+refs/remotes/origin/*:refs/remotes/origin/*", "^refs/remotes/origin/HEAD"],
+        check=True,
+        capture_output=True,
+    )
+
+
+def resolve_submodule_url(url: str, remote_url: str) -> str:
+    """Resolves a submodule URL, as `git submodule init` does.
+    Args:
+        url (str): The URL in .gitmodules, which may be relative ("../name.git").
+        remote_url (str): The URL of the superproject's origin.
+    Returns:
+        str: The absolute URL of the submodule.
+    """
+    if not url.startswith(("./", "../")):
+        return url
+    base = remote_url.rstrip("/")
+    while url.startswith(("./", "../")):
+        if url.startswith("../"):
+            base = base.rsplit("/", 1)[0]
+        url = url.split("/", 1)[1]
+    return base + "/" + url
+
+
+def get_submodule_urls(git_dir: Path, remote_url: str) -> Dict[str, str]:
+    """Returns the URLs of the submodules declared at HEAD.
+    Args:
+        git_dir (Path): The git directory of the superproject.
+        remote_url (str): The URL of the superproject's origin.
+    Returns:
+        Dict[str, str]: The absolute URL of each submodule, by submodule name.
+    """
+    result = subprocess.run(
+        ["git", "--git-dir", str(git_dir), "config", "-z", "--blob"]
+        + ["HEAD:.gitmodules", "--get-regexp", r"^submodule\..*\.url$"],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        # There is no .gitmodules, or it declares no submodule.
+        return {}
+    urls = {}
+    for entry in result.stdout.split("\0"):
+        if not entry:
+            continue
+        key, url = entry.split("\n", 1)
+        name = key[len("submodule.") : -len(".url")]
+        urls[name] = resolve_submodule_url(url, remote_url)
+    return urls
+
+
+def clone_submodule_repos(
+    git_dir: Path, remote_url: str, source_git_dir: Union[Path, None] = None
+) -> None:
+    """Clones the repositories of the submodules declared at HEAD, and of their
+    own submodules, without checking them out.  They are cloned where
+    `git submodule update --init` looks for them, in the modules directory of
+    the git directory, so that it reuses them instead of cloning them.
+    Args:
+        git_dir (Path): The git directory of the superproject.
+        remote_url (str): The URL of the superproject's origin.
+        source_git_dir (Union[Path,None], optional): The git directory of another
+            clone of the superproject, whose submodule repositories are cloned
+            with --shared instead of from their URLs.  Submodules that it lacks
+            are skipped.  Defaults to None.
+    """
+    for name, url in get_submodule_urls(git_dir, remote_url).items():
+        module_dir = git_dir / "modules" / name
+        source_module_dir = (
+            None if source_git_dir is None else source_git_dir / "modules" / name
+        )
+        if module_dir.exists() or (
+            source_module_dir is not None and not source_module_dir.exists()
+        ):
+            continue
+        module_dir.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            # The clone needs a working tree, but it is not checked out.
+            with tempfile.TemporaryDirectory() as worktree:
+                subprocess.run(
+                    ["git", "clone", "-q", "--no-checkout", "--separate-git-dir"]
+                    + [str(module_dir)]
+                    + (
+                        [url]
+                        if source_module_dir is None
+                        else ["--shared", str(source_module_dir)]
+                    )
+                    + [str(Path(worktree) / "worktree")],
+                    check=True,
+                    capture_output=True,
+                )
+            if source_module_dir is not None:
+                copy_remote_refs(module_dir, source_module_dir)
+                subprocess.run(
+                    ["git", "--git-dir", str(module_dir), "remote", "set-url"]
+                    + ["origin", url],
+                    check=True,
+                    capture_output=True,
+                )
+        except subprocess.CalledProcessError as e:
+            logger.debug(f"clone_submodule_repos: Failed to clone {url}:\n{e.stderr}")
+            shutil.rmtree(module_dir, ignore_errors=True)
+            continue
+        clone_submodule_repos(module_dir, url, source_module_dir)
+
+
 @timeout(10 * 60)
 def clone_repo(repo_slug: str, repo_dir: Path) -> None:
-    """Clones a repository, or runs `git fetch` if the repository is already cloned.
+    """Clones a repository and fetches the heads of its pull requests.
+    The clone has no working tree: it is only ever copied into a workdir, where a
+    specific commit (and its submodules) is checked out.  The repositories of its
+    submodules are cloned once here, so that checkouts in the workdirs do not
+    clone them again.
     Args:
         repo_slug (str): The slug of the repository, which is "owner/reponame".
     """
@@ -70,26 +229,21 @@ def clone_repo(repo_slug: str, repo_dir: Path) -> None:
     repo_dir.parent.mkdir(parents=True, exist_ok=True)
     os.environ["GIT_TERMINAL_PROMPT"] = "0"
     os.environ["GIT_SSH_COMMAND"] = "ssh -o BatchMode=yes"
-    # ":@" in URL ensures that we are not prompted for login details
-    # for the repos that are now private.
-    github_url = "https://:@github.com/" + repo_slug + ".git"
     try:
-        repo = git.repo.Repo.clone_from(github_url, repo_dir)
+        repo = git.repo.Repo.clone_from(
+            get_github_url(repo_slug), repo_dir, no_checkout=True
+        )
         assert (
             repo_dir.exists()
         ), f"Repo {repo_slug} does not exist after cloning {repo_dir}"
-        logger.debug(repo_slug, "clone_repo: Finished cloning")
-        repo.remote().fetch()
+        logger.debug(f"clone_repo: Finished cloning {repo_slug}")
+        # The clone already fetched every branch and tag; only the pull request
+        # heads, which are not branches, still have to be fetched.
         repo.remote().fetch("refs/pull/*/head:refs/remotes/origin/pull/*")
     except GitCommandError as e:
         logger.debug(f"clone_repo: GitCommandError during cloning {repo_slug}:\n{e}")
         raise Exception(f"GitCommandError during cloning {repo_slug}") from e
-    try:
-        repo.submodule_update()
-    except ValueError as e:
-        logger.debug(
-            f"clone_repo: ValueError during submodule update {repo_slug}:\n{e}"
-        )
+    clone_submodule_repos(repo_dir / ".git", get_github_url(repo_slug))
     if not repo_dir.exists():
         logger.error(f"Repo {repo_slug} does not exist after cloning {repo_dir}")
         raise Exception(
@@ -165,51 +319,144 @@ def stdout_and_stderr(
     source: Union[subprocess.TimeoutExpired, subprocess.CompletedProcess],
 ) -> str:
     """Produces the standard output and standard error of a timedout process."""
-    explanation = "Here is the output from: " + " ".join(command)
+    command_line = " ".join(command)
+    # The output of a test suite can be megabytes long, so the parts are joined
+    # once rather than concatenated one after another.
+    parts = ["Here is the output from: ", command_line]
     if source.stdout:
-        explanation += (
-            "\nstdout:\n"
-            + source.stdout.decode("utf-8", "replace")
-            + "\nEnd of stdout."
-        )
+        parts += [
+            "\nstdout:\n",
+            source.stdout.decode("utf-8", "replace"),
+            "\nEnd of stdout.",
+        ]
     if source.stderr:
-        explanation += (
-            "\nstderr:\n"
-            + source.stderr.decode("utf-8", "replace")
-            + "\nEnd of stderr."
-        )
-    explanation += "\nEnd of output from: " + " ".join(command)
-    return explanation
+        parts += [
+            "\nstderr:\n",
+            source.stderr.decode("utf-8", "replace"),
+            "\nEnd of stderr.",
+        ]
+    parts += ["\nEnd of output from: ", command_line]
+    return "".join(parts)
+
+
+def write_output_section(log, stream_name: str, output) -> None:
+    """Appends a captured output stream to a log, in the format of stdout_and_stderr.
+    The output is decoded chunk by chunk, so it never has to fit in memory.
+    Args:
+        log: The log, a text file open for writing.
+        stream_name (str): The name of the stream, "stdout" or "stderr".
+        output: The captured output, a binary file.
+    """
+    if output.seek(0, os.SEEK_END) == 0:
+        return
+    output.seek(0)
+    decoder = codecs.getincrementaldecoder("utf-8")("replace")
+    log.write(f"\n{stream_name}:\n")
+    for chunk in iter(lambda: output.read(1024 * 1024), b""):
+        log.write(decoder.decode(chunk))
+    log.write(decoder.decode(b"", final=True))
+    log.write(f"\nEnd of {stream_name}.")
 
 
-def repo_test(wcopy_dir: Path, timeout: int) -> Tuple[TEST_STATE, str]:
+def repo_test(wcopy_dir: Path, timeout: int, test_log_file: Path) -> TEST_STATE:
     """Returns the result of run_repo_tests.sh on the given working copy.
     If the test process passes then the function returns and marks it as passed.
     If the test process timeouts then the function returns and marks it as timedout.
+    The output of the tests is written to the test log file.
     Args:
         wcopy_dir (Path): The directory of the working copy (the clone).
         timeout (int): Test timeout limit, in seconds.
+        test_log_file (Path): The path to the test log file.
     Returns:
         TEST_STATE: The result of the test.
-        str: explanation. The explanation of the result.
     """
-    explanation = ""
     command = [
         "src/scripts/run_with_timeout.sh",
         str(timeout),
         f"src/scripts/run_repo_tests.sh {wcopy_dir}",
     ]
-    p = subprocess.run(
-        command,
-        capture_output=True,
-    )
+    command_line = " ".join(command)
+    # The output of a test suite can be megabytes long, so it is spooled to disk
+    # rather than held in memory.
+    with tempfile.TemporaryFile() as stdout, tempfile.TemporaryFile() as stderr:
+        p = subprocess.run(command, stdout=stdout, stderr=stderr)
+        with open(test_log_file, "w", encoding="utf-8") as log:
+            log.write("Here is the output from: " + command_line)
+            write_output_section(log, "stdout", stdout)
+            write_output_section(log, "stderr", stderr)
+            log.write("\nEnd of output from: " + command_line)
     if p.returncode == 124:  # Timeout
-        explanation = stdout_and_stderr(command, p)
-        return TEST_STATE.Tests_timedout, explanation
-    explanation = stdout_and_stderr(command, p)
+        return TEST_STATE.Tests_timedout
     if p.returncode == 0:  # Success
-        return TEST_STATE.Tests_passed, explanation
-    return TEST_STATE.Tests_failed, explanation
+        return TEST_STATE.Tests_passed
+    return TEST_STATE.Tests_failed
+
+
+class WorkdirReaper:
+    """Deletes workdirs in a single background thread per process.
+    A workdir is renamed out of the way at once, so that its path can be reused,
+    and deleted later by the thread.  At most WORKDIR_DELETION_BACKLOG renamed
+    workdirs wait for deletion; beyond that, `delete` waits, so that they cannot
+    pile up on disk.  At exit, the remaining workdirs are deleted before the
+    process ends.
+    """
+
+    def __init__(self) -> None:
+        self.queue: "queue.Queue[Path]" = queue.Queue(maxsize=WORKDIR_DELETION_BACKLOG)
+        self.thread: Union[threading.Thread, None] = None
+        self.closed = False
+
+    def delete(self, workdir: Path) -> None:
+        """Deletes a workdir in the background.
+        Args:
+            workdir (Path): The workdir to delete.
+        """
+        if self.closed:
+            shutil.rmtree(workdir, ignore_errors=True)
+            return
+        trash = workdir.with_name(workdir.name + ".deleted-" + uuid.uuid4().hex)
+        try:
+            workdir.rename(trash)
+            if self.thread is None:
+                thread = threading.Thread(target=self.run, daemon=True)
+                thread.start()
+                self.thread = thread
+        except (OSError, RuntimeError):
+            # The workdir was never created, or no thread can be started because
+            # the interpreter is shutting down.
+            shutil.rmtree(workdir, ignore_errors=True)
+            shutil.rmtree(trash, ignore_errors=True)
+            return
+        self.queue.put(trash)
+
+    def run(self) -> None:
+        """Deletes the renamed workdirs as they are queued."""
+        while True:
+            trash = self.queue.get()
+            shutil.rmtree(trash, ignore_errors=True)
+            self.queue.task_done()
+
+    def close(self) -> None:
+        """Waits for the queued workdirs to be deleted.  Later workdirs are
+        deleted synchronously."""
+        self.closed = True
+        self.queue.join()
+
+
+def close_at_worker_exit(reaper: WorkdirReaper) -> None:
+    """Closes the reaper of a multiprocessing worker when the worker exits
+    normally, since workers do not run atexit handlers.
+    Args:
+        reaper (WorkdirReaper): The reaper of the worker.
+    """
+    multiprocessing.util.Finalize(None, reaper.close, exitpriority=0)
+
+
+WORKDIR_REAPER = WorkdirReaper()
+atexit.register(WORKDIR_REAPER.close)
+# A forked process does not inherit the thread, so it gets its own reaper.
+os.register_at_fork(after_in_child=WORKDIR_REAPER.__init__)
+multiprocessing.util.register_after_fork(WORKDIR_REAPER, close_at_worker_exit)
 
 
 class Repository:
@@ -222,6 +469,7 @@ class Repository:
     owner: str
     name: str
     repo_path: Path
+    workdir_directory: Path
     workdir: Path
     local_repo_path: Path
     delete_workdir: bool
@@ -238,17 +486,20 @@ class Repository:
         workdir_id: str = uuid.uuid4().hex,  # uuid4 is a random UID
         delete_workdir: bool = DELETE_WORKDIRS,
         lazy_clone: bool = False,
+        workdir_directory: Path = WORKDIR_DIRECTORY,
     ) -> None:
         """Initializes the repository.
         Args:
             repo_slug (str): The slug of the repository, which is "owner/reponame".
             cache_directory (Path): The prefix of the cache.
+            workdir_directory (Path): The directory that contains the workdir.
         """
         self.merge_idx = merge_idx
         self.repo_slug = repo_slug.lower()
         self.owner, self.name = self.repo_slug.split("/")
         self.repo_path = REPOS_PATH / repo_slug
-        self.workdir = WORKDIR_DIRECTORY / workdir_id
+        self.workdir_directory = workdir_directory
+        self.workdir = workdir_directory / workdir_id
         self.local_repo_path = self.workdir / self.repo_path.name
         self.delete_workdir = delete_workdir
         self.lazy_clone = lazy_clone
@@ -268,7 +519,7 @@ class Repository:
             try:
                 clone_repo(self.repo_slug, self.repo_path)
             except Exception as e:
-                logger.error("Exception during cloning:\n", e)
+                logger.error(f"Exception during cloning {self.repo_slug}:\n{e}")
                 raise
         if not self.repo_path.exists():
             logger.error(
@@ -279,20 +530,42 @@ class Repository:
             )
 
     def copy_repo(self) -> None:
-        """Copies the repository and adjusts permissions."""
+        """Copies the repository and adjusts permissions.
+        The copy is a `git clone --shared` of the local clone: it borrows the
+        object database of the local clone instead of copying it, so only the
+        refs and the objects created in the copy (e.g., merge commits) are
+        written to the workdir.  A separate clone, unlike a `git worktree`,
+        keeps branches independent between copies and has a `.git` directory
+        that merge tools can write to.  The submodule repositories of the local
+        clone are shared the same way, and `checkout` reuses them.  A workdir
+        that is not deleted after use is made self-contained instead, so that it
+        survives the deletion of the local clone.
+        """
         if not self.repo_path.exists():
             self.clone_repo()
         if self.local_repo_path.exists():
             shutil.rmtree(self.local_repo_path, ignore_errors=True)
         self.workdir.mkdir(parents=True, exist_ok=True)
-        shutil.copytree(
-            self.repo_path,
-            self.local_repo_path,
-            symlinks=True,
-            ignore_dangling_symlinks=True,
+        # Repo.clone runs git inside the local clone, so the destination must be
+        # an absolute path.
+        self.repo = Repo(self.repo_path).clone(
+            str(self.local_repo_path.resolve()), shared=True, no_checkout=True
+        )
+        # As in the local clone, origin is the GitHub repository, against which
+        # relative submodule URLs are resolved.
+        self.repo.remote().set_url(get_github_url(self.repo_slug))
+        # Pull request heads and other branches can then be checked out by ref.
+        copy_remote_refs(
+            self.local_repo_path / ".git", self.repo_path.resolve() / ".git"
+        )
+        clone_submodule_repos(
+            self.local_repo_path / ".git",
+            get_github_url(self.repo_slug),
+            self.repo_path.resolve() / ".git",
         )
+        if not self.delete_workdir:
+            dissociate_clone(self.local_repo_path)
         os.system("chmod -R 777 " + str(self.local_repo_path))
-        self.repo = Repo(self.local_repo_path)
 
     def checkout(self, commit: str, use_cache: bool = True) -> Tuple[bool, str]:
         """Checks out the given commit.
@@ -320,7 +593,9 @@ class Repository:
         try:
             self.repo.git.checkout(commit, force=True)
             explanation = f"Checked out {commit} for {self.repo_slug}"
-            self.repo.submodule_update()
+            # Unlike Repo.submodule_update, `git submodule update` reuses the
+            # submodule repositories shared from the local clone.
+            self.repo.git.submodule("update", "--init", "--recursive")
         except Exception as e:
             explanation = (
                 "Failed to checkout "
@@ -683,9 +958,9 @@ class Repository:
         hash_dir.mkdir(parents=True, exist_ok=True)
 
         # We'll name the JSON file after the repo slug (e.g. "my_repo.json")
-        hash_file = hash_dir / Path(*self.local_repo_path.parts[1:]).with_suffix(
-            ".json"
-        )
+        hash_file = hash_dir / self.local_repo_path.relative_to(
+            self.workdir_directory
+        ).with_suffix(".json")
 
         # 1) Compute current (live) hashes
         command = (
@@ -880,7 +1155,6 @@ class Repository:
             logger.debug(
                 f"test: Running test {i+1}/{n_tests} for {self.repo_slug} at {sha}"
             )
-            test_state, test_output = repo_test(self.local_repo_path, timeout)
             if test_log_file is None:
                 test_log_file = Path(
                     os.path.join(
@@ -893,8 +1167,7 @@ class Repository:
             test_log_file.parent.mkdir(parents=True, exist_ok=True)
             if test_log_file.exists():
                 test_log_file.unlink()
-            with open(test_log_file, "w", encoding="utf-8") as f:
-                f.write(test_output)
+            test_state = repo_test(self.local_repo_path, timeout, test_log_file)
             cache_data["test_results"].append(test_state.name)
             cache_data["test_log_file"].append(str(test_log_file))
             cache_data["test_result"] = test_state.name
@@ -934,11 +1207,13 @@ class Repository:
         return total_covered / total
 
     def get_head_hash(self) -> str:
-        """Gets the hash of the head commit.
+        """Gets the hash of the head commit of the clone, cloning it if needed.
+        The clone is read directly, so no workdir copy is made.
         Returns:
             str: The hash of the head commit.
         """
-        return self.repo.head.commit.hexsha
+        self.clone_repo()
+        return Repo(self.repo_path).head.commit.hexsha
 
     def run_command(self, command: str) -> Tuple[str, str]:
         """Runs a command in the repository.
@@ -964,7 +1239,47 @@ class Repository:
             )
         return process.stdout, process.stderr
 
+    def run_command_iter(self, command: str) -> Iterator[str]:
+        """Runs a command in the repository and yields its standard output line by line,
+        while the command is still running.
+        Args:
+            command (str): The command to run.
+        Returns:
+            Iterator[str]: The lines of the standard output of the command.
+        """
+        if not self.local_repo_path.exists():
+            self.copy_repo()
+        # Standard error goes to a file so that a full pipe cannot block the command.
+        with tempfile.TemporaryFile() as stderr_file:
+            with subprocess.Popen(
+                command,
+                shell=True,
+                cwd=self.local_repo_path,
+                stdout=subprocess.PIPE,
+                stderr=stderr_file,
+                text=True,
+            ) as process:
+                assert process.stdout is not None
+                yield from process.stdout
+            if process.returncode != 0:
+                stderr_file.seek(0)
+                stderr = stderr_file.read().decode("utf-8", "replace")
+                raise RuntimeError(
+                    f"Command {command} failed with exit code {process.returncode}:\n"
+                    f"In folder {self.local_repo_path}\n"
+                    f"stderr: {stderr}"
+                )
+
     def __del__(self) -> None:
-        """Deletes the repository."""
-        if self.delete_workdir:
+        """Deletes the repository.
+        Deleting a workdir with build outputs can take seconds, so the workdir is
+        deleted by WORKDIR_REAPER, and the next task does not wait for it.  A
+        workdir on the RAM disk is deleted synchronously instead, so that its
+        memory is freed before the next task fills the RAM disk.
+        """
+        if not self.delete_workdir:
+            return
+        if self.workdir_directory == RAMDISK_DIRECTORY:
             shutil.rmtree(self.workdir, ignore_errors=True)
+            return
+        WORKDIR_REAPER.delete(self.workdir)
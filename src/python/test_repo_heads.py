@@ -19,9 +19,18 @@ import argparse
 import sys
 from pathlib import Path
 import shutil
-from typing import Tuple
+import psutil
+from typing import Tuple, Union
 from repo import Repository, TEST_STATE
-from variables import TIMEOUT_TESTING_PARENT
+from variables import (
+    TIMEOUT_TESTING_PARENT,
+    WORKDIR_DIRECTORY,
+    DELETE_WORKDIRS,
+    RAMDISK_DIRECTORY,
+    RAMDISK_SPACE_PER_TASK,
+    N_PROCESSES,
+    TASK_MEMORY,
+)
 import pandas as pd
 from loguru import logger
 from rich.progress import (
@@ -33,41 +42,103 @@ from rich.progress import (
     TextColumn,
 )
 
-logger.add(sys.stderr, colorize=True, backtrace=True, diagnose=True)
-logger.add("run.log", colorize=False, backtrace=True, diagnose=True)
+# Pool workers are forked after these sinks are added, so with enqueue=True they
+# hand their messages to the main process instead of contending for the sinks.
+logger.add(sys.stderr, colorize=True, backtrace=True, diagnose=True, enqueue=True)
+logger.add("run.log", colorize=False, backtrace=True, diagnose=True, enqueue=True)
 
 
-def num_processes(percentage: float = 0.7) -> int:
+def num_processes(
+    percentage: float = 0.7, memory_per_task: Union[float, None] = None
+) -> int:
     """Compute the number of CPUs to be used
+    The AST_N_PROCESSES environment variable, if set to a positive number,
+    overrides the computed value.
     Args:
         percentage (float, optional): Percentage of CPUs to be used. Defaults to 0.7.
+        memory_per_task (Union[float,None], optional): The memory needed by one
+            task, in bytes.  If given, the number is also limited so that every
+            process can have that much of the available memory.  Defaults to None.
     Returns:
         int: the number of CPUs to be used.
     """
+    if N_PROCESSES > 0:
+        return N_PROCESSES
     cpu_count = os.cpu_count() or 1
     processes_used = int(percentage * cpu_count) if cpu_count > 3 else cpu_count
-    return processes_used
+    if memory_per_task is None:
+        return processes_used
+    processes_fitting_in_memory = int(
+        psutil.virtual_memory().available / memory_per_task
+    )
+    return max(1, min(processes_used, processes_fitting_in_memory))
 
 
-def head_passes_tests(args: Tuple[pd.Series, Path]) -> pd.Series:
+def head_workdir_directory(processes: int) -> Path:
+    """Returns the directory in which the heads are checked out and tested.
+    Checking out and building a repository touches many small files, so the RAM
+    disk is used if RAMDISK_DIRECTORY is set, workdirs are deleted after use, and
+    the RAM disk allows executables and has RAMDISK_SPACE_PER_TASK of free space
+    for every worker.
+    Args:
+        processes (int): The number of workers that test heads concurrently.
+    Returns:
+        Path: The directory that contains the workdirs.
+    """
+    if RAMDISK_DIRECTORY is None:
+        return WORKDIR_DIRECTORY
+    ramdisk = RAMDISK_DIRECTORY.parent
+    if not DELETE_WORKDIRS:
+        logger.info(
+            f"head_workdir_directory: Not using {ramdisk}, because workdirs are "
+            "kept (DELETE_WORKDIRS is false)"
+        )
+        return WORKDIR_DIRECTORY
+    if not ramdisk.exists():
+        logger.info(
+            f"head_workdir_directory: Not using {ramdisk}, because it does not exist"
+        )
+        return WORKDIR_DIRECTORY
+    if os.statvfs(ramdisk).f_flag & os.ST_NOEXEC:
+        logger.info(
+            f"head_workdir_directory: Not using {ramdisk}, because it is mounted "
+            "noexec"
+        )
+        return WORKDIR_DIRECTORY
+    free_space = shutil.disk_usage(ramdisk).free
+    if free_space < RAMDISK_SPACE_PER_TASK * processes:
+        logger.info(
+            f"head_workdir_directory: Not using {ramdisk}, because it has "
+            f"{free_space / 1024**3:.1f} GiB free, less than "
+            f"{RAMDISK_SPACE_PER_TASK / 1024**3:.1f} GiB for each of "
+            f"{processes} workers (see AST_RAMDISK_SPACE_PER_TASK_GB)"
+        )
+        return WORKDIR_DIRECTORY
+    return RAMDISK_DIRECTORY
+
+
+def head_passes_tests(
+    args: Tuple[int, str, str, Path, Path],
+) -> Tuple[int, str, Union[str, None]]:
     """Runs tests on the head of the main branch.
     Args:
-        args (Tuple[pd.Series,Path]): A tuple containing the repository info and the cache path.
+        args (Tuple[int,str,str,Path,Path]): A tuple containing the index of the
+            repository, the repository slug, the head hash, the cache path and the
+            directory that contains the workdirs.
     Returns:
-        TEST_STATE: The result of the test.
+        int: The index of the repository.
+        str: The name of the TEST_STATE of the head.
+        Union[str,None]: The tree fingerprint of the head.
     """
-    repo_info, cache = args
-    logger.info(f"head_passes_tests: Started {repo_info['repository']}")
-    repo_slug = repo_info["repository"]
+    idx, repo_slug, head_hash, cache, workdir_directory = args
+    logger.info(f"head_passes_tests: Started {repo_slug}")
     if "/" not in repo_slug:
-        repo_info["head test result"] = "Wrong format"
-        logger.error(f"head_passes_tests: Wrong format {repo_info['repository']}")
-        raise ValueError(f"Wrong format {repo_info['repository']}")
+        logger.error(f"head_passes_tests: Wrong format {repo_slug}")
+        raise ValueError(f"Wrong format {repo_slug}")
 
-    if len(repo_info["head hash"]) != 40:
-        repo_info["head test result"] = "No valid head hash"
-        logger.error(f"head_passes_tests: No valid head hash {repo_info['repository']}")
-        raise ValueError(f"No valid head hash {repo_info['repository']}")
+    if len(head_hash) != 40:
+        logger.error(f"head_passes_tests: No valid head hash {repo_slug}")
+        raise ValueError(f"No valid head hash {repo_slug}")
 
     # Load repo
     try:
@@ -75,30 +146,23 @@ def head_passes_tests(args: Tuple[pd.Series, Path]) -> pd.Series:
             merge_idx="HEAD",
             repo_slug=repo_slug,
             cache_directory=cache,
-            workdir_id=repo_slug + "/head-" + repo_info["repository"],
+            workdir_id=repo_slug + "/head-" + repo_slug,
             lazy_clone=True,
+            workdir_directory=workdir_directory,
         )
     except Exception as e:
-        repo_info["head test result"] = TEST_STATE.Git_checkout_failed.name
-        repo_info["head tree fingerprint"] = None
-        logger.success(
-            f"head_passes_tests: Git checkout failed {repo_info['repository']} {e}"
-        )
-        return repo_info
+        logger.success(f"head_passes_tests: Git checkout failed {repo_slug} {e}")
+        return idx, TEST_STATE.Git_checkout_failed.name, None
 
     # Test repo
-    test_state, _, repo_info["head tree fingerprint"] = repo.checkout_and_test(
-        repo_info["head hash"], timeout=TIMEOUT_TESTING_PARENT, n_tests=3
+    test_state, _, tree_fingerprint = repo.checkout_and_test(
+        head_hash, timeout=TIMEOUT_TESTING_PARENT, n_tests=3
     )
     if test_state != TEST_STATE.Tests_passed:
         shutil.rmtree(repo.repo_path, ignore_errors=True)
 
-    repo_info["head test result"] = test_state.name
-
-    logger.success(
-        f"head_passes_tests: Finished {repo_info['repository']} {test_state}"
-    )
-    return repo_info
+    logger.success(f"head_passes_tests: Finished {repo_slug} {test_state}")
+    return idx, test_state.name, tree_fingerprint
 
 
 if __name__ == "__main__":
@@ -113,8 +177,20 @@ if __name__ == "__main__":
     df = pd.read_csv(arguments.repos_csv_with_hashes, index_col="idx")
 
     logger.info("test_repo_heads: Started Testing")
-    head_passes_tests_arguments = [(v, arguments.cache_dir) for _, v in df.iterrows()]
-    with multiprocessing.Pool(processes=num_processes()) as pool:
+    processes = num_processes(memory_per_task=TASK_MEMORY)
+    workdir_directory = head_workdir_directory(processes)
+    logger.info(f"test_repo_heads: Testing heads in {workdir_directory}")
+    # Arguments are generated lazily from plain lists of the needed columns,
+    # which are independent of the columns filled in below.
+    head_passes_tests_arguments = (
+        (idx, repo_slug, head_hash, arguments.cache_dir, workdir_directory)
+        for idx, repo_slug, head_hash in zip(
+            df.index.tolist(), df["repository"].tolist(), df["head hash"].tolist()
+        )
+    )
+    df["head tree fingerprint"] = None
+    df["head test result"] = None
+    with multiprocessing.Pool(processes=processes) as pool:
         with Progress(
             SpinnerColumn(),
             TextColumn("[progress.description]{task.description}"),
@@ -122,17 +198,18 @@ if __name__ == "__main__":
             TimeElapsedColumn(),
             TimeRemainingColumn(),
         ) as progress:
-            task = progress.add_task(
-                "Testing repos...", total=len(head_passes_tests_arguments)
-            )
-            head_passes_tests_results = []
-            for result in pool.imap(head_passes_tests, head_passes_tests_arguments):
-                head_passes_tests_results.append(result)
+            task = progress.add_task("Testing repos...", total=len(df))
+            # Tests take minutes per repository, so tasks are dispatched one at a
+            # time and results are reassociated with their row by index.
+            for idx, test_result, tree_fingerprint in pool.imap_unordered(
+                head_passes_tests, head_passes_tests_arguments
+            ):
+                df.at[idx, "head tree fingerprint"] = tree_fingerprint
+                df.at[idx, "head test result"] = test_result
                 progress.update(task, advance=1)
     logger.info("test_repo_heads: Finished Testing")
 
     logger.info("test_repo_heads: Started Building Output")
-    df = pd.DataFrame(head_passes_tests_results)
     filtered_df = df[df["head test result"] == TEST_STATE.Tests_passed.name]
     logger.info("test_repo_heads: Finished Building Output")
 
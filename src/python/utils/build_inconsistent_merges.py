@@ -12,10 +12,28 @@ Arguments:
 """
 
 import argparse
+import itertools
+import numpy as np
 import pandas as pd
 from typing import List
 
 
+def factorize_columns(result_df: pd.DataFrame, columns: List[str]) -> np.ndarray:
+    """Encode the values of the given columns as integer codes.
+
+    Args:
+        result_df: DataFrame containing the columns
+        columns: list of columns to encode
+
+    Returns:
+        Array with one row per row of result_df and one column per column, where
+        equal values share a code and missing values are -1
+    """
+    values = result_df[columns].to_numpy(dtype=object)
+    codes, _ = pd.factorize(values.ravel())
+    return codes.reshape(values.shape)
+
+
 def check_fingerprint_consistency(
     result_df: pd.DataFrame, merge_tools: List[str]
 ) -> pd.DataFrame:
@@ -28,30 +46,31 @@ def check_fingerprint_consistency(
     Returns:
         DataFrame with inconsistent results
     """
-    inconsistencies = []
-
-    for merge_tool1 in merge_tools:
-        for merge_tool2 in merge_tools:
-            if merge_tool1 != merge_tool2:
-                # Check if fingerprints are the same
-                same_fingerprint_mask = (
-                    result_df[merge_tool1 + "_merge_fingerprint"]
-                    == result_df[merge_tool2 + "_merge_fingerprint"]
-                )
-
-                # Check if results are the same
-                same_result_mask = result_df[merge_tool1] == result_df[merge_tool2]
-
-                # Check if the fingerprints are the same but the results are different
-                inconsistent_mask = same_fingerprint_mask & ~same_result_mask
-                if inconsistent_mask.sum() > 0:
-                    inconsistent_results = result_df[inconsistent_mask].copy()
-                    inconsistent_results["tool1"] = merge_tool1
-                    inconsistent_results["tool2"] = merge_tool2
-                    inconsistencies.append(result_df[inconsistent_mask])
-
-    if inconsistencies:
-        return pd.concat(inconsistencies).drop_duplicates()
+    fingerprint_columns = [
+        merge_tool + "_merge_fingerprint" for merge_tool in merge_tools
+    ]
+    # Factorize jointly so that equal values get equal integer codes across columns.
+    # Missing values are coded as -1 and never compare equal, as with NaN.
+    fingerprint_codes = factorize_columns(result_df, fingerprint_columns)
+    result_codes = factorize_columns(result_df, merge_tools)
+
+    inconsistent_mask = np.zeros(len(result_df), dtype=bool)
+    for i, j in itertools.combinations(range(len(merge_tools)), 2):
+        # Check if fingerprints are the same
+        same_fingerprint_mask = (fingerprint_codes[:, i] == fingerprint_codes[:, j]) & (
+            fingerprint_codes[:, i] != -1
+        )
+
+        # Check if results are the same
+        same_result_mask = (result_codes[:, i] == result_codes[:, j]) & (
+            result_codes[:, i] != -1
+        )
+
+        # Check if the fingerprints are the same but the results are different
+        inconsistent_mask |= same_fingerprint_mask & ~same_result_mask
+
+    if inconsistent_mask.any():
+        return result_df[inconsistent_mask]
     else:
         return pd.DataFrame()
 
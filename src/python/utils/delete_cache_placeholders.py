@@ -16,6 +16,8 @@ Args:
 from argparse import ArgumentParser
 from pathlib import Path
 import json
+import os
+from delete_keys_from_cache import iter_json_files, write_json_file
 
 if __name__ == "__main__":
     parser = ArgumentParser()
@@ -27,22 +29,21 @@ if __name__ == "__main__":
     cache_directory = Path(args.cache_dir)
 
     n_deleted = 0
-    for file in cache_directory.glob("**/*.json"):
-        if file.is_dir():
-            continue
+    for file in iter_json_files(cache_directory):
         try:
             with open(file, "r", encoding="utf-8") as f:
                 data = json.load(f)
         except json.JSONDecodeError:
             print(f"Could not read {file}")
-            file.unlink()
+            os.unlink(file)
             continue
 
-        for key in list(data.keys()):
-            if data[key] is None:
-                data.pop(key)
-                n_deleted += 1
+        placeholders = [key for key, value in data.items() if value is None]
+        if not placeholders:
+            continue
+        for key in placeholders:
+            data.pop(key)
+        n_deleted += len(placeholders)
 
-        with open(file, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=4, sort_keys=True)
+        write_json_file(file, data)
     print(f"Deleted {n_deleted} placeholders")
@@ -7,30 +7,69 @@ import json
 import re
 from pathlib import Path
 from argparse import ArgumentParser
+from typing import Iterator, Union
+
+
+def iter_json_files(directory: Union[Path, str]) -> Iterator[str]:
+    """Yields the paths of all the JSON files below the given directory.
+    Uses os.scandir, whose entries carry the file type read from the directory
+    listing, so no extra stat call is needed per entry.
+    A directory that does not exist yields nothing.
+    Args:
+        directory (Union[Path,str]): The directory to walk.
+    Returns:
+        Iterator[str]: The paths of the JSON files.
+    """
+    if not os.path.isdir(directory):
+        return
+    stack = [str(directory)]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name.endswith(".json"):
+                    yield entry.path
+
+
+def write_json_file(file_path: Union[Path, str], data: dict) -> None:
+    """Writes a cache file in the format used by cache_utils.
+    The data is written to a temporary file which then replaces the cache file,
+    so an interrupted run never leaves a truncated cache file behind.
+    Args:
+        file_path (Union[Path,str]): The path of the cache file.
+        data (dict): The content of the cache file.
+    """
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=4, sort_keys=True)
+    os.replace(tmp_path, file_path)
 
 
 def delete_keys_matching_regex(directory: Path, regex: str, dry_run: bool = False):
     """Delete the keys matching the given regex in the JSON files in the given directory."""
     total_deleted = 0
     pattern = re.compile(regex)
-    for root, _, files in os.walk(directory):
-        json_files = [f for f in files if f.endswith(".json")]
-        for json_file in json_files:
-            file_path = os.path.join(root, json_file)
-            with open(file_path, "r", encoding="utf-8") as file:
-                data = json.load(file)
-
-            # Record keys to delete
-            keys_to_delete = [key for key in data.keys() if pattern.search(key)]
-            if keys_to_delete:
-                for key in keys_to_delete:
-                    del data[key]
-                    total_deleted += 1
-
-            if not dry_run:
-                # Save the modified data back to file
-                with open(file_path, "w", encoding="utf-8") as file:
-                    json.dump(data, file, indent=4)
+    # A regex without special characters matches exactly the keys that contain it.
+    is_literal = re.escape(regex) == regex
+    for file_path in iter_json_files(directory):
+        with open(file_path, "r", encoding="utf-8") as file:
+            data = json.load(file)
+
+        # Record keys to delete
+        if is_literal:
+            keys_to_delete = [key for key in data if regex in key]
+        else:
+            keys_to_delete = [key for key in data if pattern.search(key)]
+        if not keys_to_delete:
+            continue
+        for key in keys_to_delete:
+            del data[key]
+            total_deleted += 1
+
+        if not dry_run:
+            # Save the modified data back to file
+            write_json_file(file_path, data)
 
     return total_deleted
 
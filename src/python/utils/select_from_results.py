@@ -21,20 +21,25 @@ fingerprints.
 """
 
 import argparse
-from os import system
 import re
-import tempfile
+import sys
 import pandas as pd
 
 
+IDENTIFIER_REGEX = re.compile(r"""(?<!['"])\b[A-Za-z_][A-Za-z0-9_]*\b(?!['"])""")
+BACKTICK_COLUMN_REGEX = re.compile(r"`([^`]+)`")
+QUERY_KEYWORDS = frozenset({"and", "or", "not", "in", "True", "False", "None"})
+
+
 def columns_in_query(query):
-    """Returns all the identifiers used in the query."""
-    result = re.findall(r"""(?<!['"])\b[A-Za-z][A-Za-z_]*\b(?!['"])""", query)
-    while "and" in result:
-        result.remove("and")
-    while "or" in result:
-        result.remove("or")
-    return result
+    """Returns all the identifiers used in the query, without duplicates."""
+    return list(
+        dict.fromkeys(
+            identifier
+            for identifier in IDENTIFIER_REGEX.findall(query)
+            if identifier not in QUERY_KEYWORDS
+        )
+    )
 
 
 # Testing:
@@ -57,11 +62,6 @@ def main():
     parser.add_argument("columns", nargs=argparse.REMAINDER)
     args = parser.parse_args()
 
-    df = pd.read_csv(args.input)
-
-    # Select some rows.
-    df = df.query(args.query)
-
     # Select some columns
     columns_to_select = (
         [
@@ -79,12 +79,22 @@ def main():
         + args.columns
         + ["repository"]
     )
+    # A column may be both a default and in the query; output it only once.
+    columns_to_select = list(dict.fromkeys(columns_to_select))
+
+    # Only parse the columns that are output or used by the query.  Columns
+    # quoted in backticks may contain characters that columns_in_query skips.
+    columns_to_read = set(columns_to_select) | set(
+        BACKTICK_COLUMN_REGEX.findall(args.query)
+    )
+    df = pd.read_csv(args.input, usecols=lambda column: column in columns_to_read)
+
+    # Select some rows.
+    df = df.query(args.query)
+
     df = df[columns_to_select]
 
-    # Gross way to produce output to standard out
-    with tempfile.NamedTemporaryFile() as tmpfile:
-        df.to_csv(tmpfile)
-        system("cat " + tmpfile.name)
+    df.to_csv(sys.stdout)
 
 
 if __name__ == "__main__":
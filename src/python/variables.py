@@ -16,6 +16,20 @@ REPOS_PATH = (
 WORKDIR_DIRECTORY = Path(
     os.getenv("WORKDIR_DIRECTORY", ".workdir")
 )  # Merges and testing will be performed in this directory.
+RAMDISK_DIRECTORY = (
+    Path(os.getenv("RAMDISK_DIRECTORY")) / WORKDIR_DIRECTORY.name  # type: ignore
+    if os.getenv("RAMDISK_DIRECTORY")
+    else None
+)  # If set (e.g., to /dev/shm), heads are tested in this directory when it is usable.
+RAMDISK_SPACE_PER_TASK = (
+    float(os.getenv("AST_RAMDISK_SPACE_PER_TASK_GB", "1")) * 1024**3
+)  # Free RAM disk space needed by one head's workdir, in bytes.
+N_PROCESSES = int(
+    os.getenv("AST_N_PROCESSES", "0")
+)  # Size of the worker pools; 0 means a fraction of the CPUs.
+TASK_MEMORY = (
+    float(os.getenv("AST_TASK_MEMORY_GB", "2")) * 1024**3
+)  # Memory needed by one task (e.g., a build and its tests), in bytes.
 
 TIMEOUT_MERGING = 60 * 15  # 15 minutes, in seconds
 
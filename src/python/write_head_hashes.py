@@ -20,6 +20,7 @@ import sys
 import argparse
 from pathlib import Path
 import multiprocessing
+from typing import Tuple, Union
 import pandas as pd
 from repo import Repository
 from test_repo_heads import num_processes
@@ -33,16 +34,17 @@ from rich.progress import (
     TextColumn,
 )
 
+HEAD_HASH_TASKS_PER_WORKER = 16
 
-def get_latest_hash(args):
+
+def get_latest_hash(repo_slug: str) -> Tuple[str, Union[str, None]]:
     """Collects the latest hash of the HEAD of the default branch for a repo.
     Args:
-        Tuple[idx,row]: Information regarding that repo.
+        repo_slug (str): The slug of the repository, which is "owner/reponame".
     Returns:
-        pd.Series: repo information with the hash of the HEAD
+        str: The slug of the repository.
+        Union[str,None]: The hash of the HEAD, or None if it could not be collected.
     """
-    _, row = args
-    repo_slug: str = row["repository"]
     logger.info("write_head_hashes: " + repo_slug + " : Started get_latest_hash")
 
     try:
@@ -51,9 +53,9 @@ def get_latest_hash(args):
             "HEAD",
             repo_slug=repo_slug,
             workdir_id=repo_slug + "/head-" + repo_slug,
-            lazy_clone=False,
+            lazy_clone=True,
         )
-        row["head hash"] = repo.get_head_hash()
+        head_hash = repo.get_head_hash()
     except Exception as e:
         logger.info(  # type: ignore
             "write_head_hashes: "
@@ -61,10 +63,10 @@ def get_latest_hash(args):
             + " : Finished get_latest_hash, result = exception, cause: "
             + str(e)
         )
-        return None
+        return repo_slug, None
 
     logger.info("write_head_hashes: " + repo_slug + " : Finished get_latest_hash")
-    return row
+    return repo_slug, head_hash
 
 
 if __name__ == "__main__":
@@ -87,9 +89,17 @@ if __name__ == "__main__":
     df["repository"] = df["repository"].str.lower()
 
     logger.info(
-        "write_head_hashes: Started cloning repos and collecting head hashes for {arguments.output_path}"
+        f"write_head_hashes: Started cloning repos and collecting head hashes for {arguments.output_path}"
     )
-    with multiprocessing.Pool(processes=num_processes()) as pool:
+    # Each repository is cloned once, even if it is listed more than once; the
+    # hashes are then mapped back onto every row.
+    repo_slugs = df["repository"].drop_duplicates().tolist()
+    head_hashes = {}
+    # Workers are replaced after a few clones, which releases the memory that
+    # GitPython and the allocator otherwise keep for the rest of the run.
+    with multiprocessing.Pool(
+        processes=num_processes(), maxtasksperchild=HEAD_HASH_TASKS_PER_WORKER
+    ) as pool:
         with Progress(
             SpinnerColumn(),
             TextColumn("[progress.description]{task.description}"),
@@ -97,13 +107,15 @@ if __name__ == "__main__":
             TimeElapsedColumn(),
             TimeRemainingColumn(),
         ) as progress:
-            task = progress.add_task("Collecting hashes...", total=len(df))
-            get_latest_hash_result = []
-            for i in pool.imap_unordered(get_latest_hash, df.iterrows()):
-                get_latest_hash_result.append(i)
+            task = progress.add_task("Collecting hashes...", total=len(repo_slugs))
+            for repo_slug, head_hash in pool.imap_unordered(
+                get_latest_hash, repo_slugs
+            ):
+                head_hashes[repo_slug] = head_hash
                 progress.update(task, advance=1)
     logger.info("write_head_hashes: Finished cloning repos and collecting head hashes")
 
-    result_df = pd.DataFrame([i for i in get_latest_hash_result if i is not None])
+    df["head hash"] = df["repository"].map(head_hashes)
+    result_df = df[df["head hash"].notna()]
     result_df.to_csv(arguments.output_path, index_label="idx")
     logger.info("write_head_hashes: Finished storing repo HEAD hashes")
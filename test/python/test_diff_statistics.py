@@ -0,0 +1,33 @@
+"""Tests for the memoized diff statistics."""
+
+from typing import Tuple
+
+import pytest
+
+from diff_statistics import get_diff_files
+
+
+class FakeRepository:
+    """Answers `git diff --name-only` with a fixed list of files."""
+
+    repo_slug = "owner/name"
+
+    def __init__(self) -> None:
+        self.commands = 0
+
+    def run_command(self, command: str) -> Tuple[str, str]:
+        """Returns the output of the command, and counts the calls."""
+        self.commands += 1
+        return "a.java\0b.txt\0", ""
+
+
+def test_get_diff_files_result_cannot_corrupt_memo() -> None:
+    repo = FakeRepository()
+    files = get_diff_files(repo, "memo-left", "memo-right")  # type: ignore
+    with pytest.raises(AttributeError):
+        files.add("c.java")  # type: ignore
+    files |= {"c.java"}
+    assert get_diff_files(repo, "memo-left", "memo-right") == frozenset(  # type: ignore
+        {"a.java", "b.txt"}
+    )
+    assert repo.commands == 1
@@ -0,0 +1,172 @@
+"""Tests for the workdir copies made by `repo.Repository`."""
+
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+
+import repo
+from repo import (
+    Repository,
+    clone_submodule_repos,
+    resolve_submodule_url,
+)
+
+
+@pytest.fixture
+def local_clone(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> str:
+    """Creates a local clone with one commit, using relative paths as the
+    default configuration does, and returns the hash of the commit."""
+    for variable in ("GIT_AUTHOR", "GIT_COMMITTER"):
+        monkeypatch.setenv(variable + "_NAME", "test")
+        monkeypatch.setenv(variable + "_EMAIL", "test@example.com")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(repo, "REPOS_PATH", Path("repos"))
+    repo_dir = tmp_path / "repos" / "owner" / "name"
+    repo_dir.mkdir(parents=True)
+    subprocess.run(["git", "init", "-q"], cwd=repo_dir, check=True)
+    (repo_dir / "file.txt").write_text("content\n")
+    subprocess.run(["git", "add", "file.txt"], cwd=repo_dir, check=True)
+    subprocess.run(["git", "commit", "-q", "-m", "initial"], cwd=repo_dir, check=True)
+    return head_hash(repo_dir)
+
+
+def head_hash(repo_dir: Path) -> str:
+    """Returns the hash of the HEAD commit of a repository."""
+    return subprocess.run(
+        ["git", "rev-parse", "HEAD"],
+        cwd=repo_dir,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout.strip()
+
+
+def make_repository(workdir_id: str, delete_workdir: bool = False) -> Repository:
+    """Returns a repository for owner/name in the relative workdir directory."""
+    return Repository(
+        merge_idx="test",
+        repo_slug="owner/name",
+        workdir_id=workdir_id,
+        delete_workdir=delete_workdir,
+        workdir_directory=Path(".workdir"),
+    )
+
+
+def alternates_files(repo_dir: Path) -> list:
+    """Returns the alternates files of a copy and of its submodule repositories."""
+    return list((repo_dir / ".git").glob("**/objects/info/alternates"))
+
+
+def test_checkout_with_relative_paths(tmp_path: Path, local_clone: str) -> None:
+    for workdir_id in ("first", "second"):
+        repository = make_repository(workdir_id)
+        assert repository.checkout(local_clone, use_cache=False)[0]
+        assert (
+            tmp_path / ".workdir" / workdir_id / "name" / "file.txt"
+        ).read_text() == "content\n"
+    assert not (tmp_path / "repos" / "owner" / "name" / ".workdir").exists()
+    assert repository.repo.remote().url == repo.get_github_url("owner/name")
+
+
+def test_deleted_workdir_shares_objects_and_refs(local_clone: str) -> None:
+    subprocess.run(
+        ["git", "update-ref", "refs/remotes/origin/pull/1", local_clone],
+        cwd=Path("repos") / "owner" / "name",
+        check=True,
+    )
+    repository = make_repository("first", delete_workdir=True)
+    assert repository.checkout("origin/pull/1", use_cache=False)[0]
+    assert alternates_files(repository.local_repo_path)
+
+
+def test_deleted_workdir_is_removed_in_background(
+    tmp_path: Path, local_clone: str
+) -> None:
+    repository = make_repository("first", delete_workdir=True)
+    assert repository.checkout(local_clone, use_cache=False)[0]
+    del repository
+    repo.WORKDIR_REAPER.queue.join()
+    assert list((tmp_path / ".workdir").iterdir()) == []
+
+
+def test_kept_workdir_outlives_local_clone(tmp_path: Path, local_clone: str) -> None:
+    repository = make_repository("first")
+    assert repository.checkout(local_clone, use_cache=False)[0]
+    assert not alternates_files(repository.local_repo_path)
+    shutil.rmtree(tmp_path / "repos")
+    subprocess.run(
+        ["git", "cat-file", "-e", local_clone + "^{tree}"],
+        cwd=repository.local_repo_path,
+        check=True,
+    )
+
+
+def commit_file(repo_dir: Path, name: str, content: str) -> None:
+    """Commits a file with the given content, creating the repository if needed."""
+    repo_dir.mkdir(parents=True, exist_ok=True)
+    subprocess.run(["git", "init", "-q"], cwd=repo_dir, check=True)
+    (repo_dir / name).write_text(content)
+    subprocess.run(["git", "add", name], cwd=repo_dir, check=True)
+    subprocess.run(["git", "commit", "-q", "-m", name], cwd=repo_dir, check=True)
+
+
+def test_checkout_reuses_submodules_of_local_clone(
+    tmp_path: Path, local_clone: str
+) -> None:
+    upstream = tmp_path / "upstream" / "owner"
+    commit_file(upstream / "module", "module.txt", "module\n")
+    commit_file(upstream / "name", "file.txt", "content\n")
+    subprocess.run(
+        ["git", "-c", "protocol.file.allow=always", "submodule", "add", "-q"]
+        + ["../module", "module"],
+        cwd=upstream / "name",
+        check=True,
+    )
+    subprocess.run(
+        ["git", "commit", "-q", "-m", "submodule"], cwd=upstream / "name", check=True
+    )
+    # Clone the repository as clone_repo does, from the local upstream.
+    repo_dir = tmp_path / "repos" / "owner" / "name"
+    shutil.rmtree(repo_dir)
+    subprocess.run(
+        ["git", "clone", "-q", "--no-checkout", str(upstream / "name"), str(repo_dir)],
+        check=True,
+    )
+    clone_submodule_repos(repo_dir / ".git", str(upstream / "name"))
+    assert [path.name for path in repo_dir.iterdir()] == [".git"]
+    # The submodule can only be checked out from the local clone.
+    shutil.rmtree(upstream / "module")
+
+    shared_repository = make_repository("shared", delete_workdir=True)
+    assert shared_repository.checkout(head_hash(repo_dir), use_cache=False)[0]
+    assert (shared_repository.local_repo_path / ".git" / "modules" / "module") in [
+        path.parents[2] for path in alternates_files(shared_repository.local_repo_path)
+    ]
+    repository = make_repository("first")
+    assert repository.checkout(head_hash(repo_dir), use_cache=False)[0]
+    assert (
+        repository.local_repo_path / "module" / "module.txt"
+    ).read_text() == "module\n"
+    shutil.rmtree(repo_dir)
+    subprocess.run(
+        ["git", "cat-file", "-e", "HEAD^{tree}"],
+        cwd=repository.local_repo_path / "module",
+        check=True,
+    )
+
+
+@pytest.mark.parametrize(
+    "url, resolved_url",
+    [
+        ("../module.git", "https://github.com/owner/module.git"),
+        ("../../other/module.git", "https://github.com/other/module.git"),
+        ("./module", "https://github.com/owner/name.git/module"),
+        ("https://example.com/module.git", "https://example.com/module.git"),
+    ],
+)
+def test_resolve_submodule_url(url: str, resolved_url: str) -> None:
+    assert (
+        resolve_submodule_url(url, "https://github.com/owner/name.git") == resolved_url
+    )